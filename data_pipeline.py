@@ -1,10 +1,16 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import pandas as pd
 from datetime import datetime, timezone
 import os
+import gzip
 from dotenv import load_dotenv
 import time
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Configuration ---
 
@@ -19,8 +25,35 @@ BILLS_TEAM_ABBREVIATION = "BUF" # NFLfastR and team ranking abbreviation
 # Retrieve the API key for The Odds API from environment variables.
 ODDS_API_KEY = os.getenv("ODDS_API_KEY")
 
+# Set DEBUG=1 to pretty-print public/dashboard_data.json for inspection. By default it is written
+# compactly, since indentation roughly doubles the size of the file the dashboard downloads.
+DEBUG = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+
 # A global flag to track the success of the pipeline. If any step fails, it's set to False.
+# Season fetches run on worker threads, so writes to the flag are guarded by a lock.
 PIPELINE_SUCCESS = True
+PIPELINE_SUCCESS_LOCK = threading.Lock()
+
+# A single shared HTTP session for the ESPN and Odds API calls. Reusing pooled keep-alive
+# connections avoids a fresh TCP+TLS handshake per request, and the adapter transparently
+# retries transient failures (rate limits and 5xx responses) with a short backoff.
+REQUEST_TIMEOUT_SECONDS = 10
+SESSION = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=20, pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+SESSION.headers.update({'User-Agent': 'nfl-insight/1.0'})
+
+# Local on-disk cache for downloads that rarely change between runs.
+# Each nflverse play-by-play season is stored as Parquet after its first download, which loads
+# far faster than re-downloading and re-parsing the gzipped CSV.
+CACHE_DIR = ".cache"
+PBP_CACHE_MAX_AGE_SECONDS = 24 * 60 * 60 # Refresh once a day so new weeks are picked up.
+# ESPN's team list and schedule change at most weekly. Odds and injuries are always fetched live.
+ESPN_CACHE_MAX_AGE_SECONDS = 60 * 60
 
 # --- Helper Functions and Constants ---
 
@@ -32,9 +65,10 @@ PLAYER_NAME_VARIANTS = {
     "kshakir": "khalilshakir", "rdavis": "raydavis", "jpalmer": "joshuapalmer"
 }
 
-# A list of betting market groups to query from The Odds API.
-# Querying in smaller, focused groups is more robust than a single large request
-# and helps ensure some data is returned even if one market is unavailable.
+# A list of betting markets to query from The Odds API. The event odds endpoint accepts a
+# comma-separated `markets` list, so these are requested in batches of MARKETS_PER_REQUEST;
+# any market the US bookmakers don't cover is retried against all regions.
+MARKETS_PER_REQUEST = 10
 MARKET_GROUPS = [
     # Standard team markets
     "h2h",
@@ -64,6 +98,24 @@ MARKET_GROUPS = [
     "player_anytime_td"
 ]
 
+# The nflfastR play-by-play files carry ~370 columns, but only these are used downstream.
+# Restricting the read to them (with compact dtypes) cuts parse time and memory substantially.
+# Team and player names repeat on every play, so they are stored as categoricals; the stat
+# columns are float32 because they are NaN on plays where they don't apply (the 0/1 flags
+# included, so they can't be plain int8). Weeks never exceed 22, so int8 is enough.
+NFLFASTR_DTYPES = {
+    'game_id': 'category', 'home_team': 'category', 'away_team': 'category',
+    'posteam': 'category', 'defteam': 'category', 'week': 'int8',
+    'yards_gained': 'float32', 'passing_yards': 'float32', 'rushing_yards': 'float32', 'receiving_yards': 'float32',
+    'pass_touchdown': 'float32', 'rush_touchdown': 'float32',
+    'pass_attempt': 'float32', 'complete_pass': 'float32', 'rush_attempt': 'float32',
+    'passer_player_name': 'category', 'rusher_player_name': 'category', 'receiver_player_name': 'category'
+}
+NFLFASTR_COLS = list(NFLFASTR_DTYPES)
+
+# Translation table that strips periods and spaces from a name in a single pass.
+_NAME_STRIP_TABLE = str.maketrans('', '', '. ')
+
 def get_nfl_season_years():
     """
     Determines the current and previous NFL season years based on the current date.
@@ -73,53 +125,139 @@ def get_nfl_season_years():
     current_season = now.year if now.month >= 3 else now.year - 1
     return current_season, current_season - 1
 
+def parse_espn_date(date_str):
+    """
+    Parses an ESPN ISO-8601 timestamp (e.g. '2025-09-08T00:20Z') into a timezone-aware datetime.
+    The trailing 'Z' is rewritten as an explicit UTC offset for older Python versions.
+    """
+    if date_str.endswith('Z'):
+        date_str = date_str[:-1] + '+00:00'
+    return datetime.fromisoformat(date_str)
+
+def find_next_game(schedule):
+    """
+    Returns the earliest game in the schedule that hasn't started yet, or None if there isn't one.
+    Each date is parsed once and compared against a single 'now'.
+    """
+    now = datetime.now(timezone.utc)
+    dated_games = [(parse_espn_date(game['date']), game) for game in schedule if game.get('date')]
+    future_games = [(game_date, game) for game_date, game in dated_games if game_date > now]
+    # min() finds the earliest game in one pass; there's no need to sort the whole list.
+    return min(future_games, key=lambda dated_game: dated_game[0])[1] if future_games else None
+
+@functools.lru_cache(maxsize=4096)
 def normalize_player_name(name):
     """
-    Standardizes a player's name by making it lowercase, removing spaces/periods,
+    Standardizes a player's name by case-folding it (Unicode-aware lowercasing), removing spaces/periods,
     and checking against the PLAYER_NAME_VARIANTS map for known aliases.
+    Results are memoized, since the same few hundred names recur across every season and market.
     """
-    lookup_name = name.replace(".", "").replace(" ", "").lower()
+    lookup_name = name.translate(_NAME_STRIP_TABLE).casefold()
     return PLAYER_NAME_VARIANTS.get(lookup_name, lookup_name)
 
+def normalize_player_names(names):
+    """
+    Vectorized counterpart of normalize_player_name for a pandas Series of names. The string
+    methods run over the whole column at once (for a categorical column, once per distinct name)
+    instead of calling the function per row.
+    """
+    lookup_names = names.str.replace(r'[. ]', '', regex=True).str.casefold()
+    return lookup_names.replace(PLAYER_NAME_VARIANTS)
+
+def get_json(url):
+    """
+    GETs `url` through the shared session and decodes the JSON body with orjson, which parses
+    the raw response bytes directly and is much faster than `response.json()`.
+    """
+    return orjson.loads(SESSION.get(url, timeout=REQUEST_TIMEOUT_SECONDS).content)
+
+def get_json_cached(url, cache_name, max_age_seconds):
+    """
+    Returns the JSON response for `url`, read from `CACHE_DIR/<cache_name>.json` while that copy
+    is fresher than `max_age_seconds`. Otherwise the URL is fetched and the cached copy refreshed.
+    """
+    cache_path = os.path.join(CACHE_DIR, f"{cache_name}.json")
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < max_age_seconds:
+        with open(cache_path, 'rb') as f:
+            return orjson.loads(f.read())
+
+    response = SESSION.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status() # Never cache an error body.
+    data = orjson.loads(response.content)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path, 'wb') as f:
+            f.write(response.content)
+    except OSError as e:
+        print(f"  > [WARN] Could not cache response from {url}: {e}")
+    return data
+
+class RateLimiter:
+    """
+    A small thread-safe rate limiter. Each call to wait() reserves the next free slot, so no more
+    than `calls_per_second` requests start per second no matter how many worker threads share it.
+    """
+    def __init__(self, calls_per_second):
+        self.interval = 1.0 / calls_per_second
+        self.lock = threading.Lock()
+        self.next_slot = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+# Caps request rate to ESPN's API across all injury worker threads, to be respectful of its rate limits.
+ESPN_RATE_LIMITER = RateLimiter(calls_per_second=10)
+
+def _fetch_injury_detail(item_ref):
+    """
+    Resolves a single injury reference from ESPN: fetches the injury details, then the
+    associated athlete. Returns the injury dictionary, or None if it can't be resolved.
+    """
+    try:
+        # 1. Fetch the specific injury details from its reference URL.
+        ESPN_RATE_LIMITER.wait()
+        injury_detail_response = get_json(item_ref['$ref'])
+
+        # 2. Fetch the athlete's details from its own separate reference URL within the injury data.
+        athlete_ref_url = injury_detail_response.get("athlete", {}).get("$ref")
+        if not athlete_ref_url:
+            return None
+
+        ESPN_RATE_LIMITER.wait()
+        athlete_detail_response = get_json(athlete_ref_url)
+
+        # 3. Extract all the required data points from the nested responses.
+        player_name = athlete_detail_response.get("displayName")
+        if not player_name:
+            return None
+        return {
+            "player_name": player_name,
+            "position": athlete_detail_response.get("position", {}).get("abbreviation"),
+            "status": injury_detail_response.get("status"),
+            "detail": injury_detail_response.get("shortComment")
+        }
+    except Exception as e_inner:
+        print(f"  > [WARN] Could not process individual injury ref {item_ref.get('$ref')}: {e_inner}")
+        return None
+
 def get_detailed_injuries(injury_list_url):
     """
     Fetches detailed injury data from ESPN's API. The initial endpoint only provides
-    links ('$ref') to the actual data, so this function performs nested API calls
-    to retrieve full details for each injury and the associated player.
+    links ('$ref') to the actual data, so each injury needs nested API calls to retrieve
+    full details for the injury and the associated player. These are I/O-bound and
+    independent, so they are resolved concurrently on a small thread pool.
     """
-    detailed_injuries = []
     try:
-        injury_list_response = requests.get(injury_list_url).json()
-        # Iterate through each injury reference provided by the initial API call.
-        for item_ref in injury_list_response.get("items", []):
-            time.sleep(0.1) # Small delay to be respectful to the API's rate limits.
-            try:
-                # 1. Fetch the specific injury details from its reference URL.
-                injury_detail_response = requests.get(item_ref['$ref']).json()
-                
-                # 2. Fetch the athlete's details from its own separate reference URL within the injury data.
-                athlete_ref_url = injury_detail_response.get("athlete", {}).get("$ref")
-                if not athlete_ref_url:
-                    continue
-                
-                time.sleep(0.1)
-                athlete_detail_response = requests.get(athlete_ref_url).json()
-
-                # 3. Extract all the required data points from the nested responses.
-                player_name = athlete_detail_response.get("displayName")
-                position = athlete_detail_response.get("position", {}).get("abbreviation")
-                status = injury_detail_response.get("status")
-                detail = injury_detail_response.get("shortComment")
-
-                if player_name:
-                    detailed_injuries.append({
-                        "player_name": player_name,
-                        "position": position,
-                        "status": status,
-                        "detail": detail
-                    })
-            except Exception as e_inner:
-                print(f"  > [WARN] Could not process individual injury ref {item_ref.get('$ref')}: {e_inner}")
+        injury_list_response = get_json(injury_list_url)
+        item_refs = injury_list_response.get("items", [])
+        # executor.map preserves the order of the original injury list.
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            detailed_injuries = [injury for injury in executor.map(_fetch_injury_detail, item_refs) if injury]
         return detailed_injuries
     except Exception as e_outer:
         print(f"  > [ERROR] Could not fetch initial injury list from {injury_list_url}: {e_outer}")
@@ -136,68 +274,176 @@ def calculate_team_rankings(season_df, season_year):
         print(f"[WARN] Cannot calculate team rankings for {season_year} without season data.")
         return {}
     
-    # Calculate offensive stats: Group by game and offensive team (posteam).
-    off_stats = season_df.groupby(['game_id', 'posteam']).agg(
-        off_yards=('yards_gained', 'sum'),
-        pass_yards=('passing_yards', 'sum'),
-        rush_yards=('rushing_yards', 'sum')
-    ).reset_index()
-    
-    # Calculate the average offensive yards per game for each team.
-    team_off_avg = off_stats.groupby('posteam').agg(
-        avg_off_yards=('off_yards', 'mean'),
-        avg_pass_yards=('pass_yards', 'mean'),
-        avg_rush_yards=('rush_yards', 'mean')
-    ).reset_index()
-
-    # Calculate defensive stats: Group by game and defensive team (defteam).
-    def_stats = season_df.groupby(['game_id', 'defteam']).agg(
-        def_yards=('yards_gained', 'sum'),
-        def_pass_yards=('passing_yards', 'sum'),
-        def_rush_yards=('rushing_yards', 'sum')
-    ).reset_index()
-
-    # Calculate the average defensive yards allowed per game for each team.
-    team_def_avg = def_stats.groupby('defteam').agg(
-        avg_def_yards=('def_yards', 'mean'),
-        avg_def_pass_yards=('def_pass_yards', 'mean'),
-        avg_def_rush_yards=('def_rush_yards', 'mean')
-    ).reset_index()
-
-    # Merge the offensive and defensive stats into a single DataFrame.
-    team_stats = pd.merge(team_off_avg, team_def_avg, left_on='posteam', right_on='defteam', how='outer')
-    team_stats = team_stats.drop(columns=['defteam'])
-    team_stats.rename(columns={'posteam': 'team'}, inplace=True)
+    # Only the three yardage columns are aggregated, so project them once up front.
+    yardage_cols = ['yards_gained', 'passing_yards', 'rushing_yards']
+
+    # Stack the plays in long form, once credited to the offense (posteam) and once to the defense
+    # (defteam), so a single groupby computes both sides: yards per game for each team, then the
+    # average across its games. `observed=True` keeps only the game/team pairs that occurred.
+    # Per-game totals are whole numbers (exact in float32), but the averages are taken in float64.
+    # Both team columns share one categorical dtype so the stacked column stays categorical (concat
+    # falls back to object when the category sets differ), and the side is an index level from
+    # `keys=` rather than a repeated string column, so every grouping key is integer-coded.
+    team_dtype = pd.CategoricalDtype(sorted(set(season_df['posteam'].dropna().unique()) | set(season_df['defteam'].dropna().unique())))
+    plays_by_side = pd.concat([
+        season_df[['game_id', 'posteam', *yardage_cols]].rename(columns={'posteam': 'team'}).astype({'team': team_dtype}),
+        season_df[['game_id', 'defteam', *yardage_cols]].rename(columns={'defteam': 'team'}).astype({'team': team_dtype})
+    ], keys=['off', 'def'], names=['side', None])
+    team_avgs = (
+        plays_by_side.groupby(['side', 'team', 'game_id'], observed=True)[yardage_cols].sum().astype('float64')
+        .groupby(level=['side', 'team'], observed=True).mean()
+        .unstack('side')
+    )
+
+    # Flatten the (stat, side) columns into the named averages, one row per team.
+    avg_columns = {
+        ('yards_gained', 'off'): 'avg_off_yards', ('passing_yards', 'off'): 'avg_pass_yards', ('rushing_yards', 'off'): 'avg_rush_yards',
+        ('yards_gained', 'def'): 'avg_def_yards', ('passing_yards', 'def'): 'avg_def_pass_yards', ('rushing_yards', 'def'): 'avg_def_rush_yards'
+    }
+    team_stats = team_avgs[list(avg_columns)].set_axis(list(avg_columns.values()), axis=1)
+    team_stats.index = team_stats.index.astype(str).rename('team')
     team_stats = team_stats.fillna(0)
     
-    # Calculate ranks. For offense, higher is better (ascending=False). For defense, lower is better (ascending=True).
-    team_stats['rank_offense_yards'] = team_stats['avg_off_yards'].rank(method='min', ascending=False).astype(int)
-    team_stats['rank_pass_offense_yards'] = team_stats['avg_pass_yards'].rank(method='min', ascending=False).astype(int)
-    team_stats['rank_rush_offense_yards'] = team_stats['avg_rush_yards'].rank(method='min', ascending=False).astype(int)
-    team_stats['rank_defense_yards'] = team_stats['avg_def_yards'].rank(method='min', ascending=True).astype(int)
-    team_stats['rank_pass_defense_yards'] = team_stats['avg_def_pass_yards'].rank(method='min', ascending=True).astype(int)
-    team_stats['rank_rush_defense_yards'] = team_stats['avg_def_rush_yards'].rank(method='min', ascending=True).astype(int)
+    # Calculate ranks, one rank() call per side over all three of its columns.
+    # For offense, higher is better (ascending=False). For defense, lower is better (ascending=True).
+    offense_rank_columns = {'avg_off_yards': 'rank_offense_yards', 'avg_pass_yards': 'rank_pass_offense_yards', 'avg_rush_yards': 'rank_rush_offense_yards'}
+    defense_rank_columns = {'avg_def_yards': 'rank_defense_yards', 'avg_def_pass_yards': 'rank_pass_defense_yards', 'avg_def_rush_yards': 'rank_rush_defense_yards'}
+    team_stats[list(offense_rank_columns.values())] = team_stats[list(offense_rank_columns)].rank(method='min', ascending=False).astype(int).to_numpy()
+    team_stats[list(defense_rank_columns.values())] = team_stats[list(defense_rank_columns)].rank(method='min', ascending=True).astype(int).to_numpy()
     
     # Convert the final DataFrame to a dictionary for easy JSON serialization.
-    rankings = team_stats.set_index('team').to_dict('index')
+    rankings = team_stats.to_dict('index')
     print(f"[OK] Team rankings for {season_year} calculated successfully.")
     return rankings
 
 # --- Core Data Fetching Logic ---
-def fetch_and_process_season_data(season, team_abbr, for_rankings=False):
+def get_remote_etag(url):
+    """
+    Returns the ETag of a remote file, following redirects, or None if it can't be determined.
+    The GitHub release assets served by nflverse carry one, so an unchanged file can be detected
+    with a HEAD request instead of a full download.
+    """
+    try:
+        response = SESSION.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        return response.headers.get("ETag")
+    except requests.RequestException as e:
+        print(f"  > [WARN] Could not check {url} for changes: {e}")
+        return None
+
+def load_season_pbp(season):
+    """
+    Loads a season's play-by-play DataFrame from the nflverse repository, caching it locally
+    as Parquet together with the ETag of the downloaded file. The cached copy is reused as-is
+    while it is fresher than PBP_CACHE_MAX_AGE_SECONDS. After that, a HEAD request compares
+    ETags and the CSV is only downloaded again if the remote file has actually changed.
+    """
+    url = f"https://github.com/nflverse/nflverse-data/releases/download/pbp/play_by_play_{season}.csv.gz"
+    cache_path = os.path.join(CACHE_DIR, f"pbp_{season}.parquet")
+    etag_path = cache_path + ".etag"
+    is_cached = os.path.exists(cache_path)
+    if is_cached and time.time() - os.path.getmtime(cache_path) < PBP_CACHE_MAX_AGE_SECONDS:
+        print(f"  > Using cached play-by-play data from {cache_path}.")
+        return pd.read_parquet(cache_path, columns=NFLFASTR_COLS)
+
+    remote_etag = get_remote_etag(url)
+    if is_cached and remote_etag and os.path.exists(etag_path):
+        with open(etag_path) as f:
+            if f.read() == remote_etag:
+                os.utime(cache_path) # Restart the freshness window for the unchanged file.
+                print(f"  > Play-by-play data for {season} is unchanged. Using {cache_path}.")
+                return pd.read_parquet(cache_path, columns=NFLFASTR_COLS)
+
+    # The download is streamed: compressed bytes flow from the socket through the gzip decompressor
+    # into the parser, so neither the compressed file nor the full CSV text sits in memory at once.
+    # The pyarrow engine parses the CSV with Arrow's multi-threaded reader, which is several times
+    # faster than pandas' single-threaded parser on a file this wide.
+    with SESSION.get(url, stream=True, timeout=REQUEST_TIMEOUT_SECONDS) as response:
+        response.raise_for_status()
+        raw = response.raw
+        raw.decode_content = False # Decompress the .gz ourselves rather than relying on headers.
+        with gzip.GzipFile(fileobj=raw) as csv_stream:
+            pbp_df = pd.read_csv(csv_stream, engine='pyarrow', usecols=NFLFASTR_COLS, dtype=NFLFASTR_DTYPES)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        pbp_df.to_parquet(cache_path, compression='zstd')
+        if remote_etag:
+            with open(etag_path, 'w') as f:
+                f.write(remote_etag)
+        elif os.path.exists(etag_path):
+            os.remove(etag_path) # Don't let a stale ETag vouch for the new download.
+    except Exception as e:
+        # A failed cache write only costs a re-download next run, so it shouldn't fail the pipeline.
+        print(f"  > [WARN] Could not cache play-by-play data for {season}: {e}")
+    return pbp_df
+
+def build_player_game_logs(team_games_df, team_abbr):
+    """
+    Aggregates the team's plays into per-player, per-week stat lines, combining the passer,
+    rusher and receiver roles in a single groupby. Returns the nested game-log dictionary,
+    {normalized player name: {week: {stats}}}.
+    """
+    # Define stat columns to aggregate for each player role (passer, rusher, receiver).
+    stat_configs = {
+        'passer': {'yards': 'passing_yards', 'tds': 'pass_touchdown', 'attempts': 'pass_attempt', 'completions': 'complete_pass'},
+        'rusher': {'yards': 'rushing_yards', 'tds': 'rush_touchdown', 'attempts': 'rush_attempt'},
+        'receiver': {'yards': 'receiving_yards', 'tds': 'pass_touchdown', 'receptions': 'complete_pass'}
+    }
+    # Every role only counts the team's own offensive plays, so that filter is applied once up front.
+    offense_plays = team_games_df[team_games_df['posteam'] == team_abbr]
+    role_plays, stat_cols, td_flag_cols = [], [], {}
+    # Loop through each role, filter the data, and rename its stat columns to role-prefixed names.
+    for role, stats in stat_configs.items():
+        player_col = f'{role}_player_name'
+        df_role = offense_plays[offense_plays[player_col].notna()]
+        role_cols = {col: f'{role}_{stat}' for stat, col in stats.items()}
+        plays = df_role[['week', player_col, *role_cols]].rename(columns={player_col: 'display_name', **role_cols})
+        # A stat that doesn't apply to a play is NaN; it counts as zero towards the player's total.
+        plays[list(role_cols.values())] = plays[list(role_cols.values())].fillna(0)
+        plays['norm_name'] = normalize_player_names(plays['display_name'])
+        role_plays.append(plays)
+        stat_cols.extend(role_cols.values())
+        if role in ['rusher', 'receiver']:
+            td_flag_cols[f'{role}_anytime_td'] = f'{role}_tds'
+            stat_cols.append(f'{role}_anytime_td')
+
+    # Aggregate every role in a single groupby over one row per player and week. A play only carries
+    # its own role's columns, so min_count=1 leaves a role's stats missing for players who didn't
+    # have that role in a game. The display name comes from the player's first role, as before.
+    # Sums are cast to nullable Int32 so they stay integers and need no per-cell conversion.
+    player_plays = pd.concat(role_plays, ignore_index=True)
+    grouped = player_plays.groupby(['norm_name', 'week'], sort=False)
+    player_weeks = grouped[[c for c in stat_cols if c not in td_flag_cols]].sum(min_count=1).astype('Int32')
+    for flag_col, tds_col in td_flag_cols.items():
+        # Flag only the games with a touchdown; the key is left out of the other games.
+        scored = (player_weeks[tds_col] > 0).fillna(False)
+        player_weeks[flag_col] = pd.Series(1, index=player_weeks.index, dtype='Int32').where(scored)
+    player_weeks.insert(0, 'display_name', grouped['display_name'].first())
+    player_weeks = player_weeks[['display_name', *stat_cols]].reset_index()
+
+    # Restructure into the nested dictionary format: {player: {week: {stats}}}. Stats a player
+    # didn't record in a role are missing in the merged frame and are left out of their week.
+    game_logs = {}
+    for row in player_weeks.to_dict('records'):
+        norm_name, week = row.pop('norm_name'), row.pop('week')
+        game_logs.setdefault(norm_name, {})[week] = {'week': week, **{k: v for k, v in row.items() if pd.notna(v)}}
+    return game_logs
+
+def fetch_and_process_season_data(season, team_abbr, for_rankings=False, pbp_df=None):
     """
     Fetches and processes play-by-play data for a given season from the nflverse repository.
     Can operate in two modes:
     1. for_rankings=True: Returns the entire season's DataFrame for all teams.
     2. for_rankings=False: Filters for a specific team and aggregates player stats into game logs.
+    An already-loaded season DataFrame can be passed as `pbp_df` to skip the download.
     """
     global PIPELINE_SUCCESS
     print_identifier = "Entire League" if for_rankings else team_abbr
     print(f"\n--> Fetching nflfastR data for {print_identifier} ({season} season)...")
     try:
-        url = f"https://github.com/nflverse/nflverse-data/releases/download/pbp/play_by_play_{season}.csv.gz"
-        pbp_df = pd.read_csv(url, compression='gzip', low_memory=False)
-        print(f"[OK] Loaded data for {season}.")
+        if pbp_df is None:
+            pbp_df = load_season_pbp(season)
+            print(f"[OK] Loaded data for {season}.")
         
         if for_rankings:
             return pbp_df
@@ -209,41 +455,26 @@ def fetch_and_process_season_data(season, team_abbr, for_rankings=False):
             return {"season": season, "player_game_logs": {}}
         print(f"  > Found {team_games_df['game_id'].nunique()} games for {team_abbr}.")
         
-        # Define stat columns to aggregate for each player role (passer, rusher, receiver).
-        stat_configs = {
-            'passer': {'yards': 'passing_yards', 'tds': 'pass_touchdown', 'attempts': 'pass_attempt', 'completions': 'complete_pass'},
-            'rusher': {'yards': 'rushing_yards', 'tds': 'rush_touchdown', 'attempts': 'rush_attempt'},
-            'receiver': {'yards': 'receiving_yards', 'tds': 'pass_touchdown', 'receptions': 'complete_pass'}
-        }
-        game_logs = {}
-        # Loop through each role, filter the data, and aggregate the stats by player and week.
-        for role, stats in stat_configs.items():
-            player_col, df_role = f'{role}_player_name', team_games_df[(team_games_df[f'{role}_player_name'].notna()) & (team_games_df['posteam'] == team_abbr)]
-            agg_dict = {f'{role}_{stat}': (col, 'sum') for stat, col in stats.items()}
-            agg_stats = df_role.groupby(['week', player_col]).agg(**agg_dict).reset_index()
-            
-            # Restructure the aggregated data into a nested dictionary format: {player: {week: {stats}}}.
-            for _, row in agg_stats.iterrows():
-                player_name, week, norm_name = row[player_col], row['week'], normalize_player_name(row[player_col])
-                game_logs.setdefault(norm_name, {}).setdefault(week, {'week': week, 'display_name': player_name})
-                game_logs[norm_name][week].update({k: int(v) for k, v in row.items() if k not in [player_col, 'week']})
-                if role in ['rusher', 'receiver'] and row.get(f'{role}_tds', 0) > 0:
-                    game_logs[norm_name][week][f'{role}_anytime_td'] = 1
+        game_logs = build_player_game_logs(team_games_df, team_abbr)
         print(f"[OK] nflfastR data for {team_abbr} ({season}) processed successfully.")
         return {"season": season, "player_game_logs": game_logs}
     except Exception as e:
         print(f"[ERROR] processing nflfastR data for {season} ({team_abbr}): {e}")
-        PIPELINE_SUCCESS = False
+        with PIPELINE_SUCCESS_LOCK:
+            PIPELINE_SUCCESS = False
         return None
 
 def fetch_espn_data(team_id):
-    """Fetches schedule and detailed injury data from ESPN's public APIs."""
+    """
+    Fetches schedule and detailed injury data from ESPN's public APIs. The upcoming game is
+    identified once here and returned as `next_game` alongside the schedule.
+    """
     global PIPELINE_SUCCESS
     print("\n--> Fetching ESPN data...")
     try:
         # First, get a map of all team IDs to their logos and abbreviations for easy lookup.
         teams_url = "https://site.api.espn.com/apis/site/v2/sports/football/nfl/teams"
-        teams_json = requests.get(teams_url).json()
+        teams_json = get_json_cached(teams_url, "espn_teams", ESPN_CACHE_MAX_AGE_SECONDS)
         team_info_map = {
             team['team']['id']: {
                 'logo': team['team']['logos'][0]['href'],
@@ -253,8 +484,8 @@ def fetch_espn_data(team_id):
 
         # Fetch the full schedule for the specified team.
         schedule_url = f"https://site.api.espn.com/apis/site/v2/sports/football/nfl/teams/{team_id}/schedule"
-        schedule_json = requests.get(schedule_url).json()
-        espn_data = {"schedule": [], "injuries": [], "opponent_injuries": []}
+        schedule_json = get_json_cached(schedule_url, f"espn_schedule_{team_id}", ESPN_CACHE_MAX_AGE_SECONDS)
+        espn_data = {"schedule": [], "next_game": None, "injuries": [], "opponent_injuries": []}
 
         for event in schedule_json.get("events", []):
             comp = event["competitions"][0]
@@ -275,8 +506,7 @@ def fetch_espn_data(team_id):
         espn_data["injuries"] = get_detailed_injuries(bills_injuries_url)
 
         # Identify the next game to fetch opponent's injury data.
-        future_games = [g for g in espn_data['schedule'] if g.get('date') and datetime.fromisoformat(g['date'].replace('Z', '+00:00')) > datetime.now(timezone.utc)]
-        next_game = sorted(future_games, key=lambda x: x['date'])[0] if future_games else None
+        next_game = espn_data["next_game"] = find_next_game(espn_data['schedule'])
 
         if next_game and next_game.get('opponent_id'):
             # Use the helper function again for the opponent.
@@ -291,10 +521,36 @@ def fetch_espn_data(team_id):
         PIPELINE_SUCCESS = False
         return None
 
+# The Odds API limits requests per second rather than one at a time, so market groups are
+# fetched concurrently under this shared cap.
+ODDS_RATE_LIMITER = RateLimiter(calls_per_second=10)
+
+def _fetch_market_group_bookmakers(api_key, sport, event_id, markets):
+    """
+    Fetches the bookmakers offering odds on a batch of markets for an event in a single request.
+    Queries US bookmakers first, then retries any markets they don't cover against all regions.
+    """
+    print(f"  > Fetching markets: {','.join(markets)}...")
+    ODDS_RATE_LIMITER.wait()
+    odds_url = f"https://api.the-odds-api.com/v4/sports/{sport}/events/{event_id}/odds?apiKey={api_key}&regions=us&markets={','.join(markets)}"
+    odds_response = get_json(odds_url)
+    bookmakers = odds_response.get('bookmakers', [])
+
+    # Fallback to all regions for any market the US bookmakers didn't return.
+    covered_markets = {market['key'] for bookmaker in bookmakers for market in bookmaker.get('markets', [])}
+    missing_markets = [m for m in markets if m not in covered_markets]
+    if missing_markets:
+        print(f"    - No US bookmakers found for {','.join(missing_markets)}, trying all regions...")
+        ODDS_RATE_LIMITER.wait()
+        odds_url = f"https://api.the-odds-api.com/v4/sports/{sport}/events/{event_id}/odds?apiKey={api_key}&markets={','.join(missing_markets)}"
+        odds_response = get_json(odds_url)
+        bookmakers = bookmakers + odds_response.get('bookmakers', [])
+    return bookmakers
+
 def fetch_all_odds_data(api_key, next_game):
     """
     Fetches all available odds for the next game by finding the correct event ID
-    and then iterating through the MARKET_GROUPS list.
+    and then fetching the MARKET_GROUPS list in concurrent, batched requests.
     """
     global PIPELINE_SUCCESS
     print("\n--> Fetching LIVE odds from The Odds API...")
@@ -309,7 +565,7 @@ def fetch_all_odds_data(api_key, next_game):
     try:
         # 1. Find the specific event ID for the upcoming game.
         events_url = f"https://api.the-odds-api.com/v4/sports/{SPORT}/events?apiKey={api_key}"
-        events_response = requests.get(events_url).json()
+        events_response = get_json(events_url)
 
         if not isinstance(events_response, list):
             print(f"[ERROR] Odds API returned an unexpected response: {events_response}")
@@ -324,40 +580,32 @@ def fetch_all_odds_data(api_key, next_game):
 
         game_odds, player_props = {}, {}
         
-        # 2. Loop through the market groups and fetch odds for each.
-        for markets in MARKET_GROUPS:
-            print(f"  > Fetching markets: {markets}...")
-            time.sleep(1) # Be respectful of API rate limits by waiting between calls.
-            
-            odds_url = f"https://api.the-odds-api.com/v4/sports/{SPORT}/events/{event_id}/odds?apiKey={api_key}&regions=us&markets={markets}"
-            odds_response = requests.get(odds_url).json()
-            bookmakers = odds_response.get('bookmakers', [])
-
-            if not bookmakers: # Fallback to all regions if US bookmakers are not found for a specific market.
-                print("    - No US bookmakers found, trying all regions...")
-                odds_url = f"https://api.the-odds-api.com/v4/sports/{SPORT}/events/{event_id}/odds?apiKey={api_key}&markets={markets}"
-                odds_response = requests.get(odds_url).json()
-                bookmakers = odds_response.get('bookmakers', [])
-
-            # Use the first bookmaker that returns valid odds for this market group.
-            best_bookmaker = next((b for b in bookmakers if b.get('markets')), None)
-            if not best_bookmaker:
-                print(f"    - No odds found for this market group.")
-                continue
-
-            # 3. Parse the response and add the odds to the appropriate dictionary.
-            for market in best_bookmaker.get('markets', []):
-                market_key = market['key']
-                if market_key in ['h2h', 'spreads', 'totals']:
-                    if market_key not in game_odds: # Prioritize the first bookmaker for main game odds.
-                        game_odds[market_key] = market['outcomes']
-                elif 'player' in market_key:
-                    for outcome in market.get('outcomes', []):
-                        player_name, norm_name = outcome['description'], normalize_player_name(outcome['description'])
-                        player_props.setdefault(norm_name, {"display_name": player_name, "markets": {}})
-                        # This ensures we don't overwrite existing player markets from different API calls.
-                        if market_key not in player_props[norm_name]['markets']:
-                            player_props[norm_name]['markets'][market_key] = market.get('outcomes', [])
+        # 2. Fetch the market batches concurrently, then parse the responses in MARKET_GROUPS order.
+        market_batches = [MARKET_GROUPS[i:i + MARKETS_PER_REQUEST] for i in range(0, len(MARKET_GROUPS), MARKETS_PER_REQUEST)]
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            fetch_batch = functools.partial(_fetch_market_group_bookmakers, api_key, SPORT, event_id)
+            batch_bookmakers = list(executor.map(fetch_batch, market_batches))
+
+        # 3. Parse the responses and add the odds to the appropriate dictionary. A batch mixes markets,
+        # so every bookmaker is walked and the first one to offer each market wins.
+        for bookmakers in batch_bookmakers:
+            for bookmaker in bookmakers:
+                for market in bookmaker.get('markets', []):
+                    market_key = market['key']
+                    if market_key in ['h2h', 'spreads', 'totals']:
+                        if market_key not in game_odds: # Prioritize the first bookmaker for main game odds.
+                            game_odds[market_key] = market['outcomes']
+                    elif 'player' in market_key:
+                        for outcome in market.get('outcomes', []):
+                            player_name, norm_name = outcome['description'], normalize_player_name(outcome['description'])
+                            player_props.setdefault(norm_name, {"display_name": player_name, "markets": {}})
+                            # This ensures we don't overwrite existing player markets from other bookmakers.
+                            if market_key not in player_props[norm_name]['markets']:
+                                player_props[norm_name]['markets'][market_key] = market.get('outcomes', [])
+
+        missing_markets = [m for m in MARKET_GROUPS if m not in game_odds and not any(m in p['markets'] for p in player_props.values())]
+        if missing_markets:
+            print(f"    - No odds found for: {', '.join(missing_markets)}.")
         
         print(f"[OK] Live odds fetched. Found props for {len(player_props)} players.")
         return {"game_odds": game_odds, "player_props": player_props}
@@ -375,25 +623,25 @@ if __name__ == "__main__":
         print("--- Starting Bills AI Dashboard Data Pipeline ---")
         current_season, previous_season = get_nfl_season_years()
 
-        # Step 1: Fetch Bills player stats for the current and previous seasons.
-        current_season_stats = fetch_and_process_season_data(current_season, BILLS_TEAM_ABBREVIATION)
-        previous_season_stats = fetch_and_process_season_data(previous_season, BILLS_TEAM_ABBREVIATION)
-        
-        # Step 2: Fetch league-wide data for both seasons to calculate team rankings.
-        previous_season_full_df = fetch_and_process_season_data(previous_season, None, for_rankings=True)
+        # Step 1: Fetch the league-wide play-by-play data for both seasons. Each season is
+        # downloaded once and shared by every step below; the two downloads run concurrently.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            current_season_full_future = executor.submit(fetch_and_process_season_data, current_season, None, True)
+            previous_season_full_future = executor.submit(fetch_and_process_season_data, previous_season, None, True)
+            current_season_full_df = current_season_full_future.result()
+            previous_season_full_df = previous_season_full_future.result()
+
+        # Step 2: Build Bills player stats and league-wide team rankings from the loaded seasons.
+        current_season_stats = fetch_and_process_season_data(current_season, BILLS_TEAM_ABBREVIATION, pbp_df=current_season_full_df)
+        previous_season_stats = fetch_and_process_season_data(previous_season, BILLS_TEAM_ABBREVIATION, pbp_df=previous_season_full_df)
         previous_team_rankings = calculate_team_rankings(previous_season_full_df, previous_season)
-        
-        current_season_full_df = fetch_and_process_season_data(current_season, None, for_rankings=True)
         current_team_rankings = calculate_team_rankings(current_season_full_df, current_season)
 
         # Step 3: Fetch schedule and injury data from ESPN.
         espn_data = fetch_espn_data(BILLS_TEAM_ID)
 
-        # Step 4: Identify the next game to determine the upcoming opponent.
-        next_game = None
-        if espn_data and espn_data.get('schedule'):
-            future_games = [g for g in espn_data['schedule'] if g.get('date') and datetime.fromisoformat(g['date'].replace('Z', '+00:00')) > datetime.now(timezone.utc)]
-            if future_games: next_game = sorted(future_games, key=lambda x: x['date'])[0]
+        # Step 4: Use the next game identified by the ESPN fetch to determine the upcoming opponent.
+        next_game = espn_data.get('next_game') if espn_data else None
         
         # Step 5: Fetch player stats for the upcoming opponent for both seasons.
         opponent_current_season_stats = None
@@ -401,8 +649,8 @@ if __name__ == "__main__":
         if next_game and next_game.get('opponent_abbr'):
             opponent_abbr = next_game['opponent_abbr']
             print(f"\n--- Opponent data fetch for {opponent_abbr} ---")
-            opponent_current_season_stats = fetch_and_process_season_data(current_season, opponent_abbr)
-            opponent_previous_season_stats = fetch_and_process_season_data(previous_season, opponent_abbr)
+            opponent_current_season_stats = fetch_and_process_season_data(current_season, opponent_abbr, pbp_df=current_season_full_df)
+            opponent_previous_season_stats = fetch_and_process_season_data(previous_season, opponent_abbr, pbp_df=previous_season_full_df)
         else:
             print("\n[INFO] No upcoming opponent found, skipping opponent stat fetch.")
 
@@ -410,20 +658,31 @@ if __name__ == "__main__":
         odds_data = fetch_all_odds_data(ODDS_API_KEY, next_game)
         
         # Step 7: Combine all fetched and processed data into a single JSON file.
+        # orjson serializes the large nested payload natively, including numpy scalars and the
+        # integer week keys of the game logs (OPT_NON_STR_KEYS), and writes bytes directly.
+        # The output is only indented in DEBUG mode.
+        json_options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if DEBUG:
+            json_options |= orjson.OPT_INDENT_2
         os.makedirs('public', exist_ok=True)
-        with open("public/dashboard_data.json", 'w') as f:
-            json.dump({ 
-                "last_updated": datetime.now().isoformat(), 
-                "espn_data": espn_data, 
-                "nfl_stats": { "current_season": current_season_stats, "previous_season": previous_season_stats },
-                "opponent_nfl_stats": {
-                    "current_season": opponent_current_season_stats,
-                    "previous_season": opponent_previous_season_stats
-                },
-                "odds": odds_data,
-                "team_rankings": previous_team_rankings,
-                "current_team_rankings": current_team_rankings
-            }, f, indent=2)
+        dashboard_json = orjson.dumps({ 
+            "last_updated": datetime.now().isoformat(), 
+            "espn_data": espn_data, 
+            "nfl_stats": { "current_season": current_season_stats, "previous_season": previous_season_stats },
+            "opponent_nfl_stats": {
+                "current_season": opponent_current_season_stats,
+                "previous_season": opponent_previous_season_stats
+            },
+            "odds": odds_data,
+            "team_rankings": previous_team_rankings,
+            "current_team_rankings": current_team_rankings
+        }, option=json_options)
+        with open("public/dashboard_data.json", 'wb') as f:
+            f.write(dashboard_json)
+        # A gzipped copy next to it lets the server (or a front-end web server) send the compressed
+        # file directly to browsers that accept gzip, instead of compressing it on every request.
+        with open("public/dashboard_data.json.gz", 'wb') as f:
+            f.write(gzip.compress(dashboard_json, compresslevel=9))
 
         # Step 8: Print a final status message based on the global success flag.
         if PIPELINE_SUCCESS:
@@ -1,9 +1,21 @@
 import os
 import requests
-from flask import Flask, request, jsonify, send_from_directory
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, Response, abort, request, jsonify, send_file
+from flask.json.provider import JSONProvider
+from werkzeug.security import safe_join
+from flask_compress import Compress
 from dotenv import load_dotenv
-import json
-import time # Import the time module for handling delays and retries
+import orjson
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+import gzip
+import mimetypes
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables from a .env file for secure key management.
 load_dotenv()
@@ -13,17 +25,338 @@ load_dotenv()
 # when a static path is requested (e.g., /dashboard_data.json).
 app = Flask(__name__, static_folder='public')
 
+class OrjsonProvider(JSONProvider):
+    """
+    Flask JSON provider backed by orjson, which parses and serializes several times faster than
+    the standard library. Used for request bodies, jsonify() and dicts returned from views.
+    """
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app.json = OrjsonProvider(app)
+
+# Compress the Gemini JSON responses (Brotli or gzip, whichever the browser accepts); they're
+# highly compressible and shrink several times over on the wire. Compression is applied per view
+# with @compress.compressed() rather than app-wide: streamed responses are left alone (compressing
+# them would buffer the whole stream and defeat the point of streaming insights), and static files
+# are sent with their own precompressed copy (see send_static_blob) or handed to the web server.
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/css', 'application/javascript']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_STREAMS'] = False
+app.config['COMPRESS_REGISTER'] = False
+compress = Compress(app)
+
+# Behind Apache (mod_xsendfile) or lighttpd, set USE_X_SENDFILE=1 to let the web server transmit
+# static files itself: Flask then answers with an X-Sendfile header naming the file instead of
+# copying its bytes through Python.
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
+
 # Retrieve the Gemini API key from the server's environment variables.
 # This is a critical security measure to avoid exposing the key on the client-side.
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# The Gemini model used for insights. Flash is several times faster (and cheaper) than Pro for this
+# kind of structured summary; set GEMINI_MODEL to change the default. A single request can also
+# ask for one of the models below with `?model=pro` or `?model=flash`, e.g. for side-by-side checks.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_MODEL_ALIASES = {'pro': 'gemini-2.5-pro', 'flash': 'gemini-2.5-flash'}
+
+# The Gemini endpoints for every model a request can use, built once at startup. The API key
+# isn't part of the URLs; it's sent in the session's `x-goog-api-key` header instead.
+GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+GEMINI_GENERATE_URLS = {model: f"{GEMINI_API_BASE_URL}/{model}:generateContent" for model in {GEMINI_MODEL, *GEMINI_MODEL_ALIASES.values()}}
+# `alt=sse` makes Gemini stream server-sent events instead of one JSON array at the end.
+GEMINI_STREAM_URLS = {model: f"{GEMINI_API_BASE_URL}/{model}:streamGenerateContent?alt=sse" for model in GEMINI_GENERATE_URLS}
+
+# Gemini responses worth retrying: rate limited (429), temporarily unavailable (503) and gateway
+# errors (502/504). Other errors, such as a 500 or a bad request, won't succeed on a second attempt.
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+# Upper bound on any single wait, however long the `Retry-After` header asks for.
+MAX_RETRY_DELAY_SECONDS = 30
+
+class CappedRetry(Retry):
+    """
+    urllib3 Retry that honors the API's `Retry-After` header, but never waits longer than
+    MAX_RETRY_DELAY_SECONDS for it, so a single request can't hang the worker.
+    """
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_DELAY_SECONDS)
+
+# (connect, read) timeout for every Gemini call, so a hung connection can't hold a worker thread
+# forever. The read timeout is the longest gap allowed between bytes (or between stream chunks),
+# which leaves room for slower models that think for a while before answering.
+GEMINI_TIMEOUT_SECONDS = (10, 120)
+
+# A single shared HTTP session for the Gemini calls. Requests made through it reuse a pooled
+# keep-alive connection to Google's API, so retries and later requests skip the TCP+TLS handshake.
+# The pool is sized so concurrent requests on a threaded server don't contend for connections.
+# Retries happen inside the adapter: up to 3 more attempts on network errors and the retryable
+# statuses above, waiting as long as `Retry-After` asks or backing off exponentially otherwise.
+# `raise_on_status=False` hands the last response back if it is still an error, so the front-end
+# sees Gemini's own status and message.
+SESSION = requests.Session()
+SESSION.headers.update({'User-Agent': 'nfl-insight/1.0', 'Content-Type': 'application/json'})
+if GEMINI_API_KEY:
+    SESSION.headers['x-goog-api-key'] = GEMINI_API_KEY
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=CappedRetry(
+        total=3, backoff_factor=1, backoff_max=MAX_RETRY_DELAY_SECONDS,
+        status_forcelist=RETRYABLE_STATUS_CODES, allowed_methods=frozenset(['POST']),
+        respect_retry_after_header=True, raise_on_status=False
+    )
+))
+
+# In-memory cache of successful Gemini responses, keyed by a hash of the request payload.
+# Page refreshes and other viewers of the same dashboard send identical prompts, so those are
+# answered straight from memory instead of waiting seconds for (and paying for) another model call.
+# Entries expire after INSIGHTS_CACHE_TTL_SECONDS; when the cache is full the oldest is dropped.
+# Requests are handled on multiple threads, so every access goes through the lock.
+INSIGHTS_CACHE_TTL_SECONDS = 600
+INSIGHTS_CACHE_MAX_ENTRIES = 512
+INSIGHTS_CACHE = {} # key -> (expires_at, response body or list of stream events)
+INSIGHTS_CACHE_LOCK = threading.Lock()
+
+def normalize_prompt_text(value):
+    """
+    Returns a copy of a Gemini payload with the whitespace in every prompt `text` part collapsed
+    to single spaces, so prompts that differ only in spacing or line breaks share a cache entry.
+    """
+    if isinstance(value, dict):
+        return {k: ' '.join(v.split()) if k == 'text' and isinstance(v, str) else normalize_prompt_text(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [normalize_prompt_text(v) for v in value]
+    return value
+
+def insights_cache_key(model, payload, kind='generate'):
+    """
+    Returns a stable key for a request payload sent to `model`: a BLAKE2b hash of the entry kind,
+    the model name and the payload's canonical JSON form (sorted keys, no whitespace, prompt text
+    normalized), so the same prompt to the same model always maps to the same entry.
+    `kind` keeps entries with different shapes apart: 'generate' holds a full Gemini response,
+    'stream' holds the list of events a completed stream relayed.
+    """
+    canonical = orjson.dumps([kind, model, normalize_prompt_text(payload)], option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+def get_cached_insight(key):
+    """Returns the cached response body for `key`, or None if it is missing or has expired."""
+    with INSIGHTS_CACHE_LOCK:
+        entry = INSIGHTS_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del INSIGHTS_CACHE[key]
+            return None
+        return entry[1]
+
+def store_cached_insight(key, body):
+    """Caches a successful response body under `key`, evicting the oldest entries if full."""
+    with INSIGHTS_CACHE_LOCK:
+        INSIGHTS_CACHE.pop(key, None) # Re-insert so the entry moves to the newest position.
+        INSIGHTS_CACHE[key] = (time.monotonic() + INSIGHTS_CACHE_TTL_SECONDS, body)
+        while len(INSIGHTS_CACHE) > INSIGHTS_CACHE_MAX_ENTRIES:
+            del INSIGHTS_CACHE[next(iter(INSIGHTS_CACHE))]
+
+# Limits for /generate-insights/batch: how many payloads one batch may carry, and how many of
+# them are sent to Gemini at once. The calls are I/O bound, so threads are enough to overlap them.
+MAX_BATCH_REQUESTS = 16
+MAX_BATCH_WORKERS = 8
+
+def resolve_model(model_alias):
+    """
+    Returns the Gemini model for a request's `?model=` alias, the configured GEMINI_MODEL when no
+    alias is given, or None if the alias isn't one of GEMINI_MODEL_ALIASES.
+    """
+    return GEMINI_MODEL_ALIASES.get(model_alias) if model_alias else GEMINI_MODEL
+
+def model_for_request():
+    """
+    Checks that an insights request can be served and picks its model. Returns `(model, None)`,
+    or `(None, error response)` when the server has no API key or `?model=` is unknown.
+    """
+    if not GEMINI_API_KEY:
+        # Fails gracefully if the server itself is missing the API key.
+        return None, (jsonify({"error": "Gemini API key not configured on the server."}), 500)
+
+    # Use the configured model unless the request picks one of the known aliases.
+    model_alias = request.args.get('model')
+    model = resolve_model(model_alias)
+    if not model:
+        return None, (jsonify({"error": f"Unknown model '{model_alias}'. Use one of: {', '.join(GEMINI_MODEL_ALIASES)}."}), 400)
+    return model, None
+
+def read_gemini_response(response):
+    """
+    Returns `(body, status code)` for a Gemini response. A gateway in front of the API can answer
+    with an HTML error page instead of JSON (e.g. a 502 that outlasted the retries); that is
+    reported as a JSON error with the upstream status instead of failing the view.
+    """
+    try:
+        return orjson.loads(response.content), response.status_code
+    except ValueError:
+        print(f"Gemini returned a non-JSON {response.status_code} response.")
+        return {"error": f"Gemini returned a non-JSON {response.status_code} response"}, response.status_code
+
+def generate_insight(model, payload):
+    """
+    Sends one generateContent request to Gemini and returns `(response body, status code)`.
+    Recently answered payloads come straight from the response cache, and only successful
+    responses are cached; errors should be retried on the next request.
+    """
+    cache_key = insights_cache_key(model, payload)
+    cached_body = get_cached_insight(cache_key)
+    if cached_body is not None:
+        return cached_body, 200
+
+    try:
+        # Rate limits and transient failures are retried by the session's adapter (see SESSION above).
+        response = SESSION.post(GEMINI_GENERATE_URLS[model], json=payload, timeout=GEMINI_TIMEOUT_SECONDS)
+    except requests.exceptions.RequestException as e:
+        # Network errors that persisted through every retry.
+        print(f"Error calling Gemini API: {e}")
+        return {"error": f"Failed to call Gemini API: {e}"}, 500
+
+    # Successful (e.g., 200 OK) or an error Gemini reported.
+    body, status = read_gemini_response(response)
+    if status == 200 and 'error' not in body:
+        store_cached_insight(cache_key, body)
+    return body, status
+
 # --- Helper function to find the next game ---
 # Note: This function is defined but not currently used in this server script.
 # It's kept for potential future server-side logic that might need to identify the next game.
 def find_next_game(schedule):
-    from datetime import datetime, timezone
-    future_games = [g for g in schedule if g.get('date') and datetime.fromisoformat(g['date'].replace('Z', '+00:00')) > datetime.now(timezone.utc)]
-    return sorted(future_games, key=lambda x: x['date'])[0] if future_games else None
+    """
+    Returns the earliest game in the schedule that hasn't started yet, or None if there isn't one.
+    Each date is parsed once against a single 'now', and min() finds the earliest in one pass
+    instead of sorting the whole list.
+    """
+    now = datetime.now(timezone.utc)
+    future_games = [
+        (game_date, game) for game_date, game in
+        ((datetime.fromisoformat(g['date'].replace('Z', '+00:00')), g) for g in schedule if g.get('date'))
+        if game_date > now
+    ]
+    return min(future_games, key=lambda dated_game: dated_game[0])[1] if future_games else None
+
+# Static files served from memory. Each file is read (and gzipped once) the first time it's
+# requested, then reused until its modification time or size changes, which happens whenever the
+# data pipeline rewrites dashboard_data.json. A request only costs an os.stat() instead of opening
+# and reading the file, and clients revalidate with If-None-Match to get a bodiless 304.
+# Only text files (the dashboard HTML, its data JSON, scripts and styles) are kept in memory and
+# gzipped; anything else, like images or archives, is streamed from disk by send_file.
+STATIC_CACHE_MAX_AGE_SECONDS = 60
+STATIC_TEXT_MIMETYPES = {'application/json', 'application/javascript', 'image/svg+xml'} # Plus every text/* type.
+STATIC_FILES = {} # file path -> {'stamp', 'etag', 'last_modified', 'mimetype', 'body', 'gzip_body'}
+STATIC_FILES_LOCK = threading.Lock()
+
+def guess_mimetype(file_path):
+    """Returns the mimetype to serve `file_path` with, treating compressed files as opaque."""
+    mimetype, encoding = mimetypes.guess_type(file_path)
+    if encoding == 'gzip':
+        return 'application/gzip'
+    return mimetype or 'application/octet-stream'
+
+def is_text_mimetype(mimetype):
+    """Returns True for the text formats worth caching in memory and gzipping."""
+    return mimetype.startswith('text/') or mimetype in STATIC_TEXT_MIMETYPES
+
+def precompressed_path(file_path):
+    """
+    Returns the path of a gzipped copy of `file_path` (`<file>.gz`, written by the data pipeline
+    for dashboard_data.json) if it exists and is at least as new as the file, otherwise None.
+    """
+    gzip_path = file_path + '.gz'
+    try:
+        if os.path.getmtime(gzip_path) >= os.path.getmtime(file_path):
+            return gzip_path
+    except OSError:
+        pass
+    return None
+
+def load_static_file(file_path):
+    """
+    Returns the in-memory copy of `file_path`, reading it again only if the file has changed
+    since it was cached. Raises OSError if the file can't be read.
+    """
+    stat = os.stat(file_path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with STATIC_FILES_LOCK:
+        blob = STATIC_FILES.get(file_path)
+    if blob is not None and blob['stamp'] == stamp:
+        return blob
+
+    with open(file_path, 'rb') as f:
+        body = f.read()
+    # Reuse the pipeline's precompressed copy when it is up to date; otherwise compress once here.
+    gzip_path = precompressed_path(file_path)
+    if gzip_path:
+        with open(gzip_path, 'rb') as f:
+            gzip_body = f.read()
+    else:
+        gzip_body = gzip.compress(body, compresslevel=6)
+    blob = {
+        'stamp': stamp,
+        'etag': hashlib.blake2b(body, digest_size=16).hexdigest(),
+        'last_modified': datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+        'mimetype': guess_mimetype(file_path),
+        'body': body,
+        'gzip_body': gzip_body
+    }
+    with STATIC_FILES_LOCK:
+        STATIC_FILES[file_path] = blob
+    return blob
+
+def send_static_blob(directory, path):
+    """
+    Serves `path` from `directory` out of the in-memory static cache, with an ETag, Last-Modified
+    and a short max-age; conditional and Range requests get a 304 or 206. The precompressed gzip
+    copy is sent to clients that accept it, so the file is never compressed per request.
+    Non-text files are sent from disk by send_file, and with USE_X_SENDFILE every transfer is
+    delegated to the web server.
+    """
+    # Relative directories are resolved against the app's folder, as send_from_directory does.
+    file_path = safe_join(os.path.join(app.root_path, directory), path)
+    if file_path is None or not os.path.isfile(file_path):
+        abort(404)
+    mimetype = guess_mimetype(file_path)
+    is_text = is_text_mimetype(mimetype)
+    use_gzip = is_text and request.accept_encodings['gzip'] > 0
+
+    if app.config['USE_X_SENDFILE'] or not is_text:
+        # Nothing is cached here: the file is streamed from disk (or by the web server). Gzip-capable
+        # clients get the precompressed copy when there is one; send_file adds the ETag and
+        # Last-Modified and handles 304s and Range requests.
+        gzip_path = precompressed_path(file_path) if use_gzip else None
+        response = send_file(gzip_path or file_path, mimetype=mimetype, conditional=True)
+        if gzip_path:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_CACHE_MAX_AGE_SECONDS}'
+        if is_text:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    try:
+        blob = load_static_file(file_path)
+    except OSError:
+        abort(404)
+
+    # The gzip copy is a different representation of the file, so it gets its own ETag.
+    body = blob['gzip_body'] if use_gzip else blob['body']
+    response = Response(body, mimetype=blob['mimetype'])
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(blob['etag'] + ('-gzip' if use_gzip else ''))
+    response.last_modified = blob['last_modified']
+    response.headers['Cache-Control'] = f'public, max-age={STATIC_CACHE_MAX_AGE_SECONDS}'
+    response.vary.add('Accept-Encoding')
+    # Turns the response into a 304 for If-None-Match/If-Modified-Since, or a 206 for a Range.
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(body))
 
 # --- Flask Routes ---
 
@@ -33,17 +366,18 @@ def index():
     Serves the main dashboard HTML file when a user visits the root URL.
     It looks for 'bills_dashboard.html' in the same directory as the server script.
     """
-    return send_from_directory('.', 'bills_dashboard.html')
+    return send_static_blob('.', 'bills_dashboard.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
     """
     Serves static files requested by the client, such as dashboard_data.json.
-    Flask automatically looks for these files in the `static_folder` defined above ('public').
+    They're looked up in the `static_folder` defined above ('public') and served from memory.
     """
-    return send_from_directory(app.static_folder, path)
+    return send_static_blob(app.static_folder, path)
 
 @app.route('/generate-insights', methods=['POST'])
+@compress.compressed()
 def generate_insights():
     """
     Acts as a secure proxy for the Gemini API.
@@ -51,54 +385,105 @@ def generate_insights():
     forwards it to Google's API, and returns the response.
     This prevents the API key from ever being exposed in the browser.
     """
-    if not GEMINI_API_KEY:
-        # Fails gracefully if the server itself is missing the API key.
-        return jsonify({"error": "Gemini API key not configured on the server."}), 500
+    model, error = model_for_request()
+    if error:
+        return error
 
-    # Implements a robust retry mechanism with exponential backoff.
-    # This automatically handles temporary issues like API rate limiting (HTTP 429).
-    MAX_RETRIES = 4 # Total attempts: 1 initial + 3 retries
-    for attempt in range(MAX_RETRIES):
-        try:
-            # The official Google Generative Language API endpoint.
-            # Using a powerful model like gemini-2.5-pro for high-quality analysis.
-            api_url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-pro:generateContent?key={GEMINI_API_KEY}"
-            
-            # The JSON payload (containing the prompt and data) from the original
-            # front-end request is passed through directly to the Gemini API.
-            payload = request.json
-
-            # Make the POST request to the Gemini API.
-            response = requests.post(api_url, json=payload, headers={'Content-Type': 'application/json'})
-
-            # If the API responds with a 429 status code, it means we've been rate-limited.
-            # We raise an exception to trigger the retry logic in the 'except' block.
-            if response.status_code == 429:
-                print(f"  > Rate limit hit. Attempt {attempt + 1} of {MAX_RETRIES}.")
-                response.raise_for_status() # This converts the HTTP error into a Python exception.
-            
-            # If the response was successful (e.g., 200 OK) or had a different error,
-            # we immediately return the result to the front-end without retrying.
-            return response.json(), response.status_code
+    # The JSON payload (containing the prompt and data) from the original front-end request
+    # is passed through directly to the Gemini API.
+    return generate_insight(model, request.json)
+
+@app.route('/generate-insights/batch', methods=['POST'])
+@compress.compressed()
+def generate_insights_batch():
+    """
+    Batch variant of /generate-insights for front-ends that render several insight cards.
+    Accepts `{"requests": [payload, ...]}`, sends every payload to Gemini concurrently, and
+    returns `{"responses": [{"status": ..., "body": ...}, ...]}` in the same order, so the whole
+    batch takes about as long as its slowest call instead of the sum of all of them.
+    """
+    model, error = model_for_request()
+    if error:
+        return error
+
+    body = request.json
+    payloads = body.get('requests') if isinstance(body, dict) else None
+    if not isinstance(payloads, list) or not payloads:
+        return jsonify({"error": "Expected a JSON body of the form {\"requests\": [payload, ...]}."}), 400
+    if len(payloads) > MAX_BATCH_REQUESTS:
+        return jsonify({"error": f"A batch can hold at most {MAX_BATCH_REQUESTS} requests."}), 400
 
+    # Each call goes through generate_insight, so the response cache and the session's retries
+    # apply to every payload in the batch.
+    with ThreadPoolExecutor(max_workers=min(len(payloads), MAX_BATCH_WORKERS)) as executor:
+        results = list(executor.map(functools.partial(generate_insight, model), payloads))
+    return jsonify({"responses": [{"status": status, "body": body} for body, status in results]})
+
+@app.route('/generate-insights/stream', methods=['POST'])
+def generate_insights_stream():
+    """
+    Streaming variant of /generate-insights. It proxies Gemini's `streamGenerateContent` endpoint
+    and relays each chunk to the front-end as a server-sent event the moment it arrives, so the
+    analysis starts rendering after the first chunk rather than after the whole response.
+    Each event's data is a partial Gemini response; their text, concatenated, is the full answer.
+    """
+    model, error = model_for_request()
+    if error:
+        return error
+
+    # A completed stream is cached as the events it relayed, under its own key, and replayed as is.
+    # Failing that, a full response cached by the regular route is sent back as a single event.
+    # (Stream entries are never served by the regular routes: the events don't add up to one body.)
+    payload = request.json
+    cache_key = insights_cache_key(model, payload, kind='stream')
+    cached_events = get_cached_insight(cache_key)
+    if cached_events is None:
+        cached_body = get_cached_insight(insights_cache_key(model, payload))
+        cached_events = None if cached_body is None else [orjson.dumps(cached_body).decode()]
+    if cached_events is not None:
+        return Response(''.join(f"data: {chunk}\n\n" for chunk in cached_events), mimetype='text/event-stream')
+
+    try:
+        # Rate limits are still retried by the session's adapter, before any streaming starts.
+        response = SESSION.post(GEMINI_STREAM_URLS[model], json=payload, stream=True, timeout=GEMINI_TIMEOUT_SECONDS)
+    except requests.exceptions.RequestException as e:
+        print(f"Error calling Gemini API: {e}")
+        return jsonify({"error": f"Failed to call Gemini API: {e}"}), 500
+
+    if response.status_code != 200:
+        # Errors come back as a regular JSON body, so they're returned like the non-streaming route.
+        with response:
+            return read_gemini_response(response)
+
+    def relay_events():
+        """
+        Yields Gemini's events to the client as they arrive, keeping them along the way so a
+        stream that completes can be cached and replayed unchanged.
+        """
+        events, completed = [], False
+        try:
+            response.encoding = 'utf-8' # SSE is always UTF-8; without this iter_lines yields bytes.
+            for line in response.iter_lines(decode_unicode=True):
+                if not line.startswith('data:'):
+                    continue
+                chunk = line[len('data:'):].strip()
+                events.append(chunk)
+                yield f"data: {chunk}\n\n"
+            completed = True
         except requests.exceptions.RequestException as e:
-            # This block catches connection errors or the 429 status code from above.
-            
-            # If this isn't the last attempt, wait before retrying.
-            if attempt < MAX_RETRIES - 1:
-                # Exponential backoff: wait 1s, then 2s, then 4s, etc.
-                delay = 2 ** attempt
-                print(f"  > Waiting for {delay} second(s) before retrying...")
-                time.sleep(delay)
-            else:
-                # If all retries have failed, log the error and return a 500 status to the client.
-                print(f"Error calling Gemini API after {MAX_RETRIES} attempts: {e}")
-                return jsonify({"error": f"Failed to call Gemini API: {e}"}), 500
-    
-    # This line should theoretically not be reached but acts as a final safeguard.
-    return jsonify({"error": "An unexpected error occurred in the retry loop."}), 500
+            # The connection dropped mid-stream; tell the client rather than ending silently.
+            print(f"Gemini stream interrupted: {e}")
+            yield f"event: error\ndata: {orjson.dumps({'error': f'Gemini stream interrupted: {e}'}).decode()}\n\n"
+        finally:
+            response.close()
+        if completed and events:
+            store_cached_insight(cache_key, events)
+
+    return Response(relay_events(), mimetype='text/event-stream')
 
 # This standard Python construct ensures that the Flask development server runs
-# only when the script is executed directly (not when imported as a module).
+# only when the script is executed directly (not when imported as a module). It's meant for
+# local use; in production the app is served by gunicorn (see the Procfile), which imports
+# `server:app` and skips this block. The debugger and reloader are opt-in with FLASK_DEBUG=1.
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    app.run(debug=os.getenv('FLASK_DEBUG') == '1', port=int(os.getenv('PORT', 5001)))